@@ -4,7 +4,7 @@
 # We use SQLite because it is lightweight and easy to integrate
 # for a backend system demo.
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 # # SQLite database stored as a file inside the project
@@ -18,6 +18,20 @@ engine = create_engine(
     connect_args={"check_same_thread": False}
 )
 
+
+# Tune SQLite for concurrent API reads + event consumer writes.
+# WAL lets readers proceed while the consumer is writing.
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_conn, _):
+    cursor = dbapi_conn.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA journal_size_limit=67108864")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.close()
+
+
 # SessionLocal will be used to interact with the DB in APIs
 SessionLocal = sessionmaker(
     autocommit=False,
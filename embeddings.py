@@ -0,0 +1,35 @@
+# embeddings.py
+# --------------
+# Loads the sentence-transformer model shared by ingestion and search.
+# Both must use the same model and device setup so product and query
+# vectors live in the same semantic space.
+
+import os
+import torch
+from sentence_transformers import SentenceTransformer
+
+# Run embeddings on GPU when available (set USE_CUDA=0 to force CPU)
+USE_CUDA = os.getenv("USE_CUDA", "1") == "1"
+DEVICE = "cuda" if USE_CUDA and torch.cuda.is_available() else "cpu"
+
+# Opt-in INT8 dynamic quantization of the model's Linear layers on CPU
+QUANTIZE_CPU = os.getenv("QUANTIZE_CPU", "0") == "1"
+
+
+def load_embedding_model():
+    """
+    Load all-MiniLM-L6-v2 on DEVICE, in FP16 on GPU or
+    INT8-quantized on CPU when QUANTIZE_CPU is set.
+    On GPU, encode() returns float16 arrays; vector_store casts
+    them to float32 before they reach FAISS.
+    """
+    model = SentenceTransformer("all-MiniLM-L6-v2", device=DEVICE)
+
+    # Reduced precision halves memory traffic during encoding
+    if DEVICE == "cuda":
+        model = model.half()
+    elif QUANTIZE_CPU:
+        model = torch.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+    return model
@@ -1,4 +1,8 @@
-from redis import Redis
+import asyncio
+from collections import defaultdict
+
+from redis.asyncio import Redis
+from sqlalchemy import bindparam, update
 from database import SessionLocal
 from models import Product
 from database import engine
@@ -31,52 +35,167 @@ STREAM = "user_events"
 GROUP = "analytics_group"
 CONSUMER = "worker_1"
 
-# Create consumer group (run once)
-try:
-    r.xgroup_create(STREAM, GROUP, id="0", mkstream=True)
-except:
-    pass
-
-
-while True:
-    messages = r.xreadgroup(
-        GROUP,
-        CONSUMER,
-        {STREAM: ">"},
-        count=10,
-        block=2000
-    )
-
-    if not messages:
-        continue
-
-    db = SessionLocal()
+# Max events read (and committed together) per round-trip
+BATCH_SIZE = 500
 
-    for _, events in messages:
-        for msg_id, data in events:
-            product_id = data.get("product_id")
-            event_type = data.get("event_type")
+# Pending events idle this long are considered abandoned by a crashed worker
+CLAIM_MIN_IDLE_MS = 60000
 
-            if not product_id:
-                r.xack(STREAM, GROUP, msg_id)
-                continue
-
-            product = db.query(Product).filter_by(product_id=product_id).first()
-            if not product:
-                r.xack(STREAM, GROUP, msg_id)
-                continue
-
-            # Update counters when a event happens
-            if event_type == "click":
-                product.click_count += 1
-            elif event_type == "add_to_cart":
-                product.add_to_cart_count += 1
-            elif event_type == "purchase":
-                product.purchase_count += 1
-            print(f"Processed event {event_type} for product {product_id}")
-
-            r.xack(STREAM, GROUP, msg_id)
-
-    db.commit()
-    db.close()
+# Batches read but not yet committed; bounds memory if the DB falls behind
+QUEUE_SIZE = 2
 
+# Increment behavioral counters for one product by the aggregated deltas
+UPDATE_COUNTERS = (
+    update(Product)
+    .where(Product.product_id == bindparam("pid"))
+    .values(
+        click_count=Product.click_count + bindparam("clicks"),
+        add_to_cart_count=Product.add_to_cart_count + bindparam("carts"),
+        purchase_count=Product.purchase_count + bindparam("buys"),
+    )
+)
+
+
+def apply_events(events):
+    """
+    Apply a batch of (msg_id, data) stream entries to the DB
+    in one transaction. Returns the message ids to acknowledge.
+    Runs in a worker thread since SQLAlchemy here is synchronous.
+    """
+    # Aggregate counter deltas per product: [clicks, carts, purchases]
+    deltas = defaultdict(lambda: [0, 0, 0])
+    msg_ids = []
+
+    for msg_id, data in events:
+        msg_ids.append(msg_id)
+
+        # Entries deleted from the stream come back with no data
+        data = data or {}
+
+        product_id = data.get("product_id")
+        event_type = data.get("event_type")
+
+        if not product_id:
+            continue
+
+        # Update counters when a event happens
+        if event_type == "click":
+            deltas[product_id][0] += 1
+        elif event_type == "add_to_cart":
+            deltas[product_id][1] += 1
+        elif event_type == "purchase":
+            deltas[product_id][2] += 1
+        print(f"Processed event {event_type} for product {product_id}")
+
+    if deltas:
+        db = SessionLocal()
+        # One executemany UPDATE for the whole batch
+        # (unknown product_ids simply match no rows)
+        db.connection().execute(
+            UPDATE_COUNTERS,
+            [
+                {"pid": pid, "clicks": c, "carts": a, "buys": b}
+                for pid, (c, a, b) in deltas.items()
+            ]
+        )
+        db.commit()
+        db.close()
+
+    return msg_ids
+
+
+async def recover_pending(queue):
+    """
+    Re-queue events that were delivered but never acknowledged:
+    first this consumer's own pending list (left by a previous run),
+    then idle entries owned by other consumers.
+    """
+    # Drain our own pending list. Reading from an explicit id returns
+    # history instead of new entries; advance past each batch so entries
+    # still waiting in the queue are not re-read.
+    last_id = "0"
+    while True:
+        messages = await r.xreadgroup(
+            GROUP,
+            CONSUMER,
+            {STREAM: last_id},
+            count=BATCH_SIZE
+        )
+        events = [
+            (msg_id, data)
+            for _, entries in messages or []
+            for msg_id, data in entries
+        ]
+        if not events:
+            break
+        await queue.put(events)
+        last_id = events[-1][0]
+
+    # Claim entries other consumers left idle for CLAIM_MIN_IDLE_MS.
+    # Redis 6.2 replies [cursor, entries]; 7.0+ adds a third element with
+    # deleted ids, while 6.2 returns deleted entries as (None, None).
+    cursor = "0-0"
+    while True:
+        response = await r.xautoclaim(
+            STREAM,
+            GROUP,
+            CONSUMER,
+            min_idle_time=CLAIM_MIN_IDLE_MS,
+            start_id=cursor,
+            count=BATCH_SIZE
+        )
+        cursor, claimed = response[0], response[1]
+
+        claimed = [(msg_id, data) for msg_id, data in claimed if msg_id]
+        if claimed:
+            await queue.put(claimed)
+        if cursor == "0-0":
+            break
+
+
+async def reader(queue):
+    """
+    Read event batches from Redis and hand them to the writer,
+    so the next read overlaps with the previous batch's commit.
+    """
+    await recover_pending(queue)
+
+    while True:
+        messages = await r.xreadgroup(
+            GROUP,
+            CONSUMER,
+            {STREAM: ">"},
+            count=BATCH_SIZE,
+            block=2000
+        )
+
+        for _, events in messages or []:
+            if events:
+                await queue.put(events)
+
+
+async def writer(queue):
+    """
+    Commit queued batches to the DB, acknowledging each only
+    after its transaction succeeds.
+    """
+    while True:
+        events = await queue.get()
+        msg_ids = await asyncio.to_thread(apply_events, events)
+        await r.xack(STREAM, GROUP, *msg_ids)
+        queue.task_done()
+
+
+async def main():
+    # Create consumer group (run once)
+    try:
+        await r.xgroup_create(STREAM, GROUP, id="0", mkstream=True)
+    except:
+        pass
+
+    queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+    await asyncio.gather(reader(queue), writer(queue))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
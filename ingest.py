@@ -4,13 +4,49 @@
 # Accepts CSV data, normalizes fields, stores structured data in SQL,
 # and generates vector embeddings for semantic search.
 
-import pandas as pd
-from sentence_transformers import SentenceTransformer
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+from embeddings import DEVICE, load_embedding_model
 from models import Product
-from vector_store import add_embedding
+from vector_store import (
+    add_embeddings_batch,
+    indexed_product_ids,
+    save as save_vector_store,
+)
 
 # Load embedding model once
-embedding_model = SentenceTransformer("all-MiniLM-L6-v2")
+embedding_model = load_embedding_model()
+
+# Column types are pinned up front: the streaming Arrow reader infers
+# types from the first block only, so columns like size that mix numbers
+# ("6") with words ("Medium"), or prices that are whole numbers early on
+# and fractional later ("99.5"), would otherwise fail mid-ingest.
+STRING_COLUMNS = [
+    "product_id", "title", "description", "category", "brand", "size", "color"
+]
+FLOAT_COLUMNS = ["price", "rating"]
+
+
+def read_csv_batches(file, batch_size):
+    """
+    Stream a CSV with PyArrow's incremental reader and
+    yield lists of at most batch_size row dicts.
+    """
+    column_types = {col: pa.string() for col in STRING_COLUMNS}
+    column_types.update({col: pa.float64() for col in FLOAT_COLUMNS})
+
+    reader = pa_csv.open_csv(
+        file,
+        convert_options=pa_csv.ConvertOptions(column_types=column_types)
+    )
+
+    for record_batch in reader:
+        for start in range(0, record_batch.num_rows, batch_size):
+            # to_pylist builds plain dicts directly from Arrow columns,
+            # avoiding pandas' slow per-row iterrows()
+            yield record_batch.slice(start, batch_size).to_pylist()
+
 
 # The ingestion pipeline processes product data in batches,
 # allowing it to scale to large catalogs without loading the entire
@@ -29,19 +65,38 @@ def ingest_csv(file, db, batch_size=500):
         pid for (pid,) in db.query(Product.product_id).all()
     }
 
-    # Read CSV in chunks (scalable for large datasets)
-    for chunk in pd.read_csv(file, chunksize=batch_size):
+    # Products already in SQL *and* the vector store are fully ingested.
+    # Rows that are in SQL but missing a vector (e.g. an earlier ingest
+    # failed before saving the index) get re-embedded below.
+    indexed_ids = existing_ids & indexed_product_ids()
 
-        products_to_add = []
+    try:
+        # Read CSV in chunks (scalable for large datasets)
+        for chunk in read_csv_batches(file, batch_size):
+            ingest_chunk(chunk, db, existing_ids, indexed_ids)
+    finally:
+        # Persist embeddings once per ingest, even if it failed partway,
+        # so vectors for already-committed chunks are not lost
+        save_vector_store()
 
-        for _, row in chunk.iterrows():
-            pid = row["product_id"]
 
-            # ✅ Skip if product already exists
-            if pid in existing_ids:
-                continue
+def ingest_chunk(chunk, db, existing_ids, indexed_ids):
+    """
+    Store one batch of CSV rows in SQL and the vector store.
+    """
+    products_to_add = []
+    texts = []
+    pids = []
+
+    for row in chunk:
+        pid = row["product_id"]
 
-            # Create Product object
+        # ✅ Skip if product is already stored and embedded
+        if pid in indexed_ids:
+            continue
+
+        # Create Product object (unless only the vector was missing)
+        if pid not in existing_ids:
             product = Product(
                 product_id=pid,
                 title=row["title"],
@@ -57,19 +112,40 @@ def ingest_csv(file, db, batch_size=500):
             products_to_add.append(product)
             existing_ids.add(pid)  # prevent duplicates in same upload
 
-            # Text used for semantic embedding
-            text = f"{row['title']} {row['description']} {row['brand']} {row['category']}"
+        indexed_ids.add(pid)
 
-            # Generate embedding
-            embedding = embedding_model.encode(
-                text,
-                normalize_embeddings=True
-            )
+        # Text used for semantic embedding
+        texts.append(
+            f"{row['title']} {row['description']} {row['brand']} {row['category']}"
+        )
+        pids.append(pid)
+
+    if not texts:
+        return
+
+    # Generate embeddings for the whole chunk in one call
+    # (much faster than encoding row by row)
+    # Smart batching: sort texts by length so each mini-batch
+    # holds similar-length texts and less padding is computed
+    order = np.argsort([len(t) for t in texts])
+
+    embeddings = embedding_model.encode(
+        [texts[i] for i in order],
+        batch_size=64,
+        normalize_embeddings=True,
+        show_progress_bar=False,
+        convert_to_numpy=True,
+        device=DEVICE
+    )
+
+    # Restore original row order
+    embeddings = embeddings[np.argsort(order)]
 
-            # Store embedding in vector database
-            add_embedding(pid, embedding)
+    # Bulk insert for better performance
+    if products_to_add:
+        db.bulk_save_objects(products_to_add)
+        db.commit()
 
-        # Bulk insert for better performance
-        if products_to_add:
-            db.bulk_save_objects(products_to_add)
-            db.commit()
+    # Store embeddings in vector database only after the SQL commit,
+    # so the index never holds vectors for rows that were not saved
+    add_embeddings_batch(pids, embeddings)
@@ -1,21 +1,47 @@
+import hashlib
 import os
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import AsyncOpenAI
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
 
 # Load env variables
 load_dotenv()
 
-client = OpenAI(
+# Async client so explanations for all results can be generated concurrently
+client = AsyncOpenAI(
     api_key=os.getenv("OPENROUTER_API_KEY"),
     base_url="https://openrouter.ai/api/v1"
 )
 
-def generate_llm_explanation(query: str, product: dict) -> str:
+# Redis cache for explanations, keyed by (query, product_id)
+redis_client = Redis(host="localhost", port=6379, decode_responses=True)
+
+# How long a cached explanation stays valid (seconds)
+EXPLANATION_TTL = 3600
+
+
+def explanation_cache_key(query: str, product_id: str) -> str:
+    """Build the Redis key for a cached (query, product) explanation."""
+    digest = hashlib.md5(f"{query}|{product_id}".encode()).hexdigest()
+    return f"expl:{digest}"
+
+
+async def generate_llm_explanation(query: str, product: dict) -> str:
     """
     Generates a short explanation (1–2 sentences) explaining
     why a product was shown for a user query using OpenRouter.
     """
 
+    key = explanation_cache_key(query, product["product_id"])
+    # The cache is best-effort: if Redis is unreachable, call the LLM
+    try:
+        cached = await redis_client.get(key)
+    except RedisError:
+        cached = None
+    if cached:
+        return cached
+
     prompt = f"""
 You are a precise product ranking explanation assistant.
 
@@ -37,7 +63,7 @@ Mention the most influential score.
 Use only the given information.
 """
 
-    response = client.chat.completions.create(
+    response = await client.chat.completions.create(
         model="mistralai/mistral-7b-instruct",
         messages=[
             {
@@ -53,4 +79,9 @@ Use only the given information.
         max_tokens=120
     )
 
-    return response.choices[0].message.content.strip()
+    explanation = response.choices[0].message.content.strip()
+    try:
+        await redis_client.setex(key, EXPLANATION_TTL, explanation)
+    except RedisError:
+        pass
+    return explanation
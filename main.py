@@ -6,6 +6,8 @@
 # This file initializes the API, connects the database,
 # creates tables, and exposes the ingestion endpoint.
 
+import asyncio
+
 from fastapi import FastAPI, UploadFile
 from pydantic import BaseModel
 from enum import Enum
@@ -17,7 +19,7 @@ import redis
 from database import engine, SessionLocal
 from models import Base
 from ingest import ingest_csv
-from search import semantic_search
+from search import semantic_search, invalidate_brand_cache, load_product_cache
 
 
 # -------------------- APP INIT --------------------
@@ -29,6 +31,11 @@ app = FastAPI(title="Contextual Search API")
 # This runs once when the app starts
 Base.metadata.create_all(bind=engine)
 
+# Load the product catalog into memory for fast candidate filtering
+db = SessionLocal()
+load_product_cache(db)
+db.close()
+
 
 # -------------------- REDIS INIT (NEW) --------------------
 
@@ -77,6 +84,10 @@ def ingest_products(file: UploadFile):
     """
     db = SessionLocal()
     ingest_csv(file.file, db)
+
+    # Refresh search caches with the newly ingested products
+    load_product_cache(db)
+    invalidate_brand_cache()
     db.close()
     return {"status": "Products ingested successfully"}
 
@@ -84,26 +95,46 @@ def ingest_products(file: UploadFile):
 # -------------------- SEARCH --------------------
 
 @app.get("/search")
-def search_products(query: str):
+async def search_products(query: str):
     """
     Search products using semantic similarity + filters.
     """
+    # Search is CPU/DB bound, so keep it off the event loop
     db = SessionLocal()
-    results = semantic_search(db, query)
-    db.close()
-
-
+    try:
+        results = await asyncio.to_thread(semantic_search, db, query)
+    finally:
+        db.close()
+
+    # ✅LLM-generated explanations, requested concurrently for all results
+    explanations = await asyncio.gather(*[
+        generate_llm_explanation(
+            query,
+            {
+                "product_id": r["product"]["product_id"],
+                "brand": r["product"]["brand"],
+                "category": r["product"]["category"],
+                "price": r["product"]["price"],
+                "rating": r["product"]["rating"],
+                "semantic_score": r["semantic_score"],
+                "norm_click": r["norm_click"],
+                "norm_cart": r["norm_cart"],
+                "norm_buy": r["norm_buy"],
+            }
+        )
+        for r in results
+    ])
 
     return [
         {
-            "product_id": r["product"].product_id,
-            "title": r["product"].title,
-            "category": r["product"].category,
-            "brand": r["product"].brand,
-            "price": r["product"].price,
-            "size": r["product"].size,
-            "color": r["product"].color,
-            "rating": r["product"].rating,
+            "product_id": r["product"]["product_id"],
+            "title": r["product"]["title"],
+            "category": r["product"]["category"],
+            "brand": r["product"]["brand"],
+            "price": r["product"]["price"],
+            "size": r["product"]["size"],
+            "color": r["product"]["color"],
+            "rating": r["product"]["rating"],
 
             # 👇 DEBUG / EXPLAINABILITY
             "semantic_score": r["semantic_score"],
@@ -112,22 +143,9 @@ def search_products(query: str):
             "normalized_purchase_score": r["norm_buy"],
             "bounce_penalty": r["norm_bounce"],
             "final_score": r["final_score"],
-            # ✅LLM-generated explanation
-            "explanation": generate_llm_explanation(
-                query,
-                {
-                    "brand": r["product"].brand,
-                    "category": r["product"].category,
-                    "price": r["product"].price,
-                    "rating": r["product"].rating,
-                    "semantic_score": r["semantic_score"],
-                    "norm_click": r["norm_click"],
-                    "norm_cart": r["norm_cart"],
-                    "norm_buy": r["norm_buy"],
-                }
-            )
+            "explanation": explanation
         }
-        for r in results
+        for r, explanation in zip(results, explanations)
     ]
 
 
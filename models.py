@@ -29,7 +29,8 @@ class Product(Base):
     title = Column(String)
     description = Column(String)
     category = Column(String)
-    brand = Column(String)
+    # Indexed for the DISTINCT brand lookup in search.get_brands
+    brand = Column(String, index=True)
 
 # Structured attributes used for filtering
     price = Column(Float)
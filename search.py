@@ -1,12 +1,32 @@
 import re
-from sentence_transformers import SentenceTransformer
+import time
+from functools import lru_cache
+import numpy as np
+from sqlalchemy import func
 from sqlalchemy.orm import Session
+from embeddings import load_embedding_model
 from models import Product
 from vector_store import search_embeddings
 
 # Same embedding model used during ingestion
 # Ensures query and product vectors live in the same semantic space
-model = SentenceTransformer("all-MiniLM-L6-v2")
+model = load_embedding_model()
+
+# Intent patterns compiled once at import, case-insensitive
+_PRICE_BETWEEN = re.compile(r"between\s+(\d+\.?\d*k?)\s+and\s+(\d+\.?\d*k?)", re.I)
+_PRICE_UNDER = re.compile(r"(under|below|less than)\s+(\d+\.?\d*k?)", re.I)
+_PRICE_OVER = re.compile(r"(above|over|more than)\s+(\d+\.?\d*k?)", re.I)
+_SIZE = re.compile(r"size\s*(\w+)", re.I)
+_RATING_OVER = re.compile(r"(above|over|more than)\s+(\d(\.\d)?)\s*(star|rating)", re.I)
+_RATING = re.compile(r"(\d(\.\d)?)\s*(star|rating)", re.I)
+
+# Distinct brands are cached briefly instead of scanned per query
+BRAND_CACHE_TTL = 60
+_BRAND_CACHE = {"ts": 0, "brands": []}
+
+# In-memory catalog: product_id -> static product attributes.
+# Populated at startup and refreshed after ingestion.
+PRODUCT_CACHE = {}
 
 # -------------------- HELPERS --------------------
 
@@ -21,14 +41,15 @@ def normalize_number(token: str) -> int:
     return int(token)
 
 
-def min_max_norm(value, min_v, max_v):
+def min_max_norm(values, min_v, max_v):
     """
     Normalize behavioral signals to [0, 1]
     so they can be safely combined with semantic scores.
+    Works element-wise on NumPy arrays.
     """
     if max_v == min_v:
-        return 0.0
-    return (value - min_v) / (max_v - min_v)
+        return np.zeros_like(values, dtype=np.float64)
+    return (values - min_v) / (max_v - min_v)
 
 
 def get_min_max_counts(db: Session):
@@ -36,22 +57,75 @@ def get_min_max_counts(db: Session):
     Fetch min & max values of interaction signals
     Used for normalization during re-ranking.
     """
-    stats = db.query(
-        Product.click_count,
-        Product.add_to_cart_count,
-        Product.purchase_count
-    ).all()
-
-    clicks = [s[0] for s in stats]
-    carts = [s[1] for s in stats]
-    buys = [s[2] for s in stats]
+    # Single aggregate query instead of pulling every row into Python
+    (
+        click_min, click_max,
+        cart_min, cart_max,
+        buy_min, buy_max,
+    ) = db.query(
+        func.min(Product.click_count), func.max(Product.click_count),
+        func.min(Product.add_to_cart_count), func.max(Product.add_to_cart_count),
+        func.min(Product.purchase_count), func.max(Product.purchase_count),
+    ).one()
 
     return {
-        "click_min": min(clicks), "click_max": max(clicks),
-        "cart_min": min(carts), "cart_max": max(carts),
-        "buy_min": min(buys), "buy_max": max(buys),
+        "click_min": click_min, "click_max": click_max,
+        "cart_min": cart_min, "cart_max": cart_max,
+        "buy_min": buy_min, "buy_max": buy_max,
     }
 
+def load_product_cache(db: Session):
+    """
+    (Re)load static product attributes into PRODUCT_CACHE
+    so search can filter candidates without a SQL round-trip.
+    """
+    rows = db.query(
+        Product.product_id, Product.title, Product.category, Product.brand,
+        Product.price, Product.size, Product.color, Product.rating,
+    ).all()
+
+    # update() rather than clear() so concurrent searches never see an empty cache
+    PRODUCT_CACHE.update({row.product_id: row._asdict() for row in rows})
+
+
+def matches_filters(product, brand, color, size, min_price, max_price, rating):
+    """
+    Python equivalent of the structured SQL filters
+    (case-insensitive substring for brand/color, exact size, numeric ranges).
+    """
+    if brand and brand not in (product["brand"] or "").lower():
+        return False
+
+    if color and color not in (product["color"] or "").lower():
+        return False
+
+    if size and product["size"] != size:
+        return False
+
+    price = product["price"]
+    if min_price is not None and (price is None or price < min_price):
+        return False
+
+    if max_price is not None and (price is None or price > max_price):
+        return False
+
+    if rating is not None and (product["rating"] is None or product["rating"] < rating):
+        return False
+
+    return True
+
+@lru_cache(maxsize=4096)
+def embed_query(query: str):
+    """
+    Encode a normalized query string, caching recent queries so
+    repeated searches skip the transformer forward pass.
+    The model is uncased, so lowercasing the key doesn't change the vector.
+    """
+    embedding = model.encode(query, normalize_embeddings=True)
+    # Cached arrays are shared between requests, so make them read-only
+    embedding.setflags(write=False)
+    return embedding
+
 # -------------------- INTENT EXTRACTORS --------------------
 
 def extract_price_range(query: str):
@@ -59,20 +133,18 @@ def extract_price_range(query: str):
     Extract explicit price intent from the query
     Example: 'under 5k', 'between 2k and 6k'
     """
-    q = query.lower()
-
     # between X and Y
-    match = re.search(r"between\s+(\d+\.?\d*k?)\s+and\s+(\d+\.?\d*k?)", q)
+    match = _PRICE_BETWEEN.search(query)
     if match:
         return normalize_number(match.group(1)), normalize_number(match.group(2))
 
     # under / below
-    match = re.search(r"(under|below|less than)\s+(\d+\.?\d*k?)", q)
+    match = _PRICE_UNDER.search(query)
     if match:
         return None, normalize_number(match.group(2))
 
     # above / over
-    match = re.search(r"(above|over|more than)\s+(\d+\.?\d*k?)", q)
+    match = _PRICE_OVER.search(query)
     if match:
         return normalize_number(match.group(2)), None
 
@@ -81,8 +153,8 @@ def extract_price_range(query: str):
 
 def extract_size(query: str):
     """Extract size intent if explicitly mentioned"""
-    match = re.search(r"size\s*(\w+)", query.lower())
-    return match.group(1) if match else None
+    match = _SIZE.search(query)
+    return match.group(1).lower() if match else None
 
 
 def extract_color(query: str):
@@ -94,27 +166,43 @@ def extract_color(query: str):
     return None
 
 
+def get_brands(db: Session):
+    """
+    Return the lowercased distinct brand list, cached for
+    BRAND_CACHE_TTL seconds to avoid a DISTINCT scan per query.
+    """
+    if time.time() - _BRAND_CACHE["ts"] > BRAND_CACHE_TTL:
+        _BRAND_CACHE["brands"] = [
+            b.lower() for (b,) in db.query(Product.brand).distinct() if b
+        ]
+        _BRAND_CACHE["ts"] = time.time()
+    return _BRAND_CACHE["brands"]
+
+
+def invalidate_brand_cache():
+    """Force the brand list to be reloaded (e.g. after ingestion)."""
+    _BRAND_CACHE["ts"] = 0
+
+
 def extract_brand(query: str, db: Session):
     """
     Match brand names dynamically from DB
     Avoids hardcoding brand lists.
     """
-    brands = [b[0].lower() for b in db.query(Product.brand).distinct()]
-    for brand in brands:
-        if brand and brand in query.lower():
+    q = query.lower()
+    for brand in get_brands(db):
+        if brand in q:
             return brand
     return None
 
 
 def extract_rating(query: str):
     """Extract rating intent like '4 star', 'above 4.5 rating'"""
-    q = query.lower()
-
-    match = re.search(r"(above|over|more than)\s+(\d(\.\d)?)\s*(star|rating)", q)
+    match = _RATING_OVER.search(query)
     if match:
         return float(match.group(2))
 
-    match = re.search(r"(\d(\.\d)?)\s*(star|rating)", q)
+    match = _RATING.search(query)
     if match:
         return float(match.group(1))
 
@@ -131,8 +219,8 @@ def semantic_search(db: Session, query: str, top_k: int = 10):
     3. Learning-based re-ranking
     """
 
-    # 1️⃣ Convert user query into embedding
-    query_embedding = model.encode(query, normalize_embeddings=True)
+    # 1️⃣ Convert user query into embedding (cached for repeated queries)
+    query_embedding = embed_query(query.strip().lower())
 
     # 2️⃣ Over-fetch from FAISS to avoid early filtering loss
     FAISS_K = top_k * 5
@@ -153,91 +241,86 @@ def semantic_search(db: Session, query: str, top_k: int = 10):
     min_price, max_price = extract_price_range(query)
 
     # 4️⃣ Apply structured filters AFTER semantic retrieval
-    # This preserves relevance while respecting constraints
-    q = db.query(Product).filter(Product.product_id.in_(product_ids))
-
-    if brand:
-        q = q.filter(Product.brand.ilike(f"%{brand}%"))
-
-    if color:
-        q = q.filter(Product.color.ilike(f"%{color}%"))
-
-    if size:
-        q = q.filter(Product.size == size)
-
-    if min_price is not None:
-        q = q.filter(Product.price >= min_price)
-
-    if max_price is not None:
-        q = q.filter(Product.price <= max_price)
+    # This preserves relevance while respecting constraints.
+    # Catalog attributes come from the in-memory cache, so filtering
+    # only touches the FAISS candidates and needs no SQL.
+    filtered_ids = [
+        pid for pid in product_ids
+        if pid in PRODUCT_CACHE and matches_filters(
+            PRODUCT_CACHE[pid], brand, color, size, min_price, max_price, rating
+        )
+    ]
+    if not filtered_ids:
+        return []
 
-    if rating is not None:
-        q = q.filter(Product.rating >= rating)
+    # Behavioral counters are updated by the event consumer process,
+    # so read only those (by indexed product_id) fresh from the DB
+    counters = db.query(
+        Product.product_id,
+        Product.click_count,
+        Product.add_to_cart_count,
+        Product.purchase_count,
+    ).filter(Product.product_id.in_(filtered_ids)).all()
 
-    products = q.all()
+    products = [
+        {
+            **PRODUCT_CACHE[pid],
+            "click_count": clicks,
+            "add_to_cart_count": carts,
+            "purchase_count": buys,
+        }
+        for pid, clicks, carts, buys in counters
+    ]
     if not products:
         return []
 
     # 5️⃣ Fetch statistics for behavior-based normalization
     stats = get_min_max_counts(db)
 
-    ranked_results = []
-
-    for p in products:
-        # Convert FAISS distance to similarity score
-        distance = distance_map.get(p.product_id, 1.0)
-        semantic_score = 1 / (1 + distance)
-
-        # Normalize interaction signals
-        norm_click = min_max_norm(
-            p.click_count, stats["click_min"], stats["click_max"]
-        )
-        norm_cart = min_max_norm(
-            p.add_to_cart_count, stats["cart_min"], stats["cart_max"]
-        )
-        norm_buy = min_max_norm(
-            p.purchase_count, stats["buy_min"], stats["buy_max"]
-        )
-
-        # Approximate bounce as low-intent interaction
-        bounce = max(
-            p.click_count - p.add_to_cart_count - p.purchase_count, 0
-        )
-        norm_bounce = min_max_norm(
-            bounce, stats["click_min"], stats["click_max"]
-        )
-
-        # Final ranking score combines relevance + behavior
-        final_score = (
-            0.55 * semantic_score
-            + 0.20 * norm_buy
-            + 0.15 * norm_cart
-            + 0.10 * norm_click
-            - 0.10 * norm_bounce
-        )
-
-        ranked_results.append(
-            (
-                final_score,
-                {
-                    "product": p,
-                    "semantic_score": round(semantic_score, 4),
-                    "norm_click": round(norm_click, 4),
-                    "norm_cart": round(norm_cart, 4),
-                    "norm_buy": round(norm_buy, 4),
-                    "norm_bounce": round(norm_bounce, 4),
-                }
-            )
-        )
-
-    # Sort results by combined relevance score
-    ranked_results.sort(key=lambda x: x[0], reverse=True)
+    # Struct-of-arrays view of the candidates for vectorized scoring
+    clicks = np.array([p["click_count"] for p in products], dtype=np.float64)
+    carts = np.array([p["add_to_cart_count"] for p in products], dtype=np.float64)
+    buys = np.array([p["purchase_count"] for p in products], dtype=np.float64)
+    distances = np.array(
+        [distance_map.get(p["product_id"], 1.0) for p in products], dtype=np.float64
+    )
+
+    # Convert FAISS distance to similarity score
+    semantic_scores = 1 / (1 + distances)
+
+    # Normalize interaction signals
+    norm_clicks = min_max_norm(clicks, stats["click_min"], stats["click_max"])
+    norm_carts = min_max_norm(carts, stats["cart_min"], stats["cart_max"])
+    norm_buys = min_max_norm(buys, stats["buy_min"], stats["buy_max"])
+
+    # Approximate bounce as low-intent interaction
+    bounces = np.maximum(clicks - carts - buys, 0)
+    norm_bounces = min_max_norm(
+        bounces, stats["click_min"], stats["click_max"]
+    )
+
+    # Final ranking score combines relevance + behavior
+    final_scores = (
+        0.55 * semantic_scores
+        + 0.20 * norm_buys
+        + 0.15 * norm_carts
+        + 0.10 * norm_clicks
+        - 0.10 * norm_bounces
+    )
+
+    # Sort results by combined relevance score (stable, like list.sort)
+    order = np.argsort(-final_scores, kind="stable")[:top_k]
 
     # Final top-k results returned to API
     return [
         {
-            **item,
-            "final_score": round(score, 4)
+            "product": products[i],
+            "semantic_score": round(float(semantic_scores[i]), 4),
+            "norm_click": round(float(norm_clicks[i]), 4),
+            "norm_cart": round(float(norm_carts[i]), 4),
+            "norm_buy": round(float(norm_buys[i]), 4),
+            "norm_bounce": round(float(norm_bounces[i]), 4),
+            "final_score": round(float(final_scores[i]), 4),
         }
-        for score, item in ranked_results[:top_k]
+        for i in order
     ]
@@ -3,27 +3,100 @@
 # This file manages the vector database using FAISS.
 # It stores embeddings and allows semantic similarity search.
 
+import hashlib
+import os
+import pickle
 import faiss
 import numpy as np
 
 # Dimension of embeddings produced by all-MiniLM-L6-v2
 EMBEDDING_DIM = 384
 
-# FAISS index for similarity search (L2 distance)
-index = faiss.IndexFlatL2(EMBEDDING_DIM)
+# Neighbours per node in the HNSW graph
+HNSW_M = 32
 
-# Mapping from FAISS index position → product_id
-product_ids = []
+# Candidate list size at query time (must be >= top_k for good recall)
+HNSW_EF_SEARCH = 128
 
+# Files used to persist the index across restarts
+INDEX_PATH = "./faiss.idx"
+IDS_PATH = "./ids.pkl"
 
-def add_embedding(product_id, embedding):
+
+def new_index():
+    """
+    Build an empty FAISS HNSW index for approximate similarity search.
+    Embeddings are normalized, so inner product == cosine similarity.
+    HNSW needs no training step, so products can be added incrementally.
+    IDMap lets FAISS store and return our own int64 ids directly.
+    """
+    base_index = faiss.IndexHNSWFlat(EMBEDDING_DIM, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+    base_index.hnsw.efSearch = HNSW_EF_SEARCH
+    return faiss.IndexIDMap2(base_index)
+
+
+# Reload a previously saved index so restarts don't require re-ingestion
+if os.path.exists(INDEX_PATH) and os.path.exists(IDS_PATH):
+    index = faiss.read_index(INDEX_PATH)
+    # Mapping from FAISS int64 id → product_id
+    with open(IDS_PATH, "rb") as f:
+        id_to_pid = pickle.load(f)
+else:
+    index = new_index()
+    id_to_pid = {}
+
+
+def product_id_to_int(product_id):
+    """
+    Hash a string product_id to a stable, non-negative int64 FAISS id.
+    """
+    digest = hashlib.blake2b(str(product_id).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") & 0x7FFFFFFFFFFFFFFF
+
+
+def add_embeddings_batch(pids, matrix):
+    """
+    Store a batch of product embeddings in the FAISS index
+    with a single add call.
     """
-    Store a product embedding in the FAISS index.
+    vectors = np.ascontiguousarray(matrix, dtype="float32")
+    ids = np.array([product_id_to_int(pid) for pid in pids], dtype="int64")
+    index.add_with_ids(vectors, ids)
+    id_to_pid.update(zip(ids.tolist(), pids))
+
+
+def indexed_product_ids():
+    """
+    Return the set of product_ids that currently have an embedding.
+    """
+    return set(id_to_pid.values())
+
+
+def _atomic_write(path, write):
     """
-    vector = np.array([embedding]).astype("float32")
-    index.add(vector)
-    product_ids.append(product_id)
+    Write a file via a temp path + os.replace, so a crash
+    mid-write never leaves a truncated file at `path`.
+    """
+    tmp_path = f"{path}.tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def save():
+    """
+    Persist the FAISS index and id mapping to disk.
+    The index is written first: if a crash lands between the two
+    replaces, the extra vectors just have no mapping yet and are
+    ignored by search, and their products get re-embedded on the
+    next ingest.
+    """
+    _atomic_write(INDEX_PATH, lambda path: faiss.write_index(index, path))
+
+    def write_ids(path):
+        with open(path, "wb") as f:
+            pickle.dump(id_to_pid, f)
 
+    _atomic_write(IDS_PATH, write_ids)
 
 
 def search_embeddings(query_embedding, top_k=50):
@@ -34,10 +107,12 @@ def search_embeddings(query_embedding, top_k=50):
         return []
 
     vector = np.array([query_embedding]).astype("float32")
-    distances, indices = index.search(vector, top_k)
+    distances, ids = index.search(vector, top_k)
 
-    results = []
-    for idx, dist in zip(indices[0], distances[0]):
-        if idx < len(product_ids):
-            results.append((product_ids[idx], float(dist)))
-    return results
+    # Convert cosine similarity to squared L2 distance between
+    # unit vectors so callers keep "lower is closer" semantics
+    return [
+        (id_to_pid[i], float(2 - 2 * sim))
+        for i, sim in zip(ids[0].tolist(), distances[0])
+        if i in id_to_pid
+    ]